@@ -1,7 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import openpyxl
+import os
 import re
-import difflib
+from pathlib import Path
+import pyarrow.csv as pacsv
+import ahocorasick
+from rapidfuzz import fuzz, process
 
 st.set_page_config(page_title="Project Samarth:Smart Agriculture Chatbot", layout="centered")
 
@@ -11,131 +17,255 @@ st.set_page_config(page_title="Project Samarth:Smart Agriculture Chatbot", layou
 AGRI_PATH = "crop.xlsx"        
 RAINFALL_PATH = "rainfall.csv" 
 
-@st.cache_data
+CACHE_DIR = os.environ.get("SAMARTH_CACHE_DIR")
+
+AGRI_COLUMNS = ["State", "Crop", "Crop_Year", "Production"]
+RAIN_COLUMNS = ["SUBDIVISION", "YEAR", "ANNUAL"]
+
+STATE_ALIASES = {"THE DADRA AND NAGAR HAVELI": "Dadra and Nagar Haveli"}
+
+STATE_SUBDIV_OVERRIDES = {
+    "Andhra Pradesh": "COASTAL ANDHRA PRADESH",
+    "Gujarat": "GUJARAT REGION",
+    "Karnataka": "COASTAL KARNATAKA",
+    "Madhya Pradesh": "WEST MADHYA PRADESH",
+    "Maharashtra": "MADHYA MAHARASHTRA",
+    "Rajasthan": "WEST RAJASTHAN",
+    "Uttar Pradesh": "WEST UTTAR PRADESH",
+    "West Bengal": "GANGETIC WEST BENGAL",
+}
+
+YEAR_RE = re.compile(r"(?:19|20)\d{2}")
+TOP_RE = re.compile(r"top[-\s]*(\d+)")
+WORD_RE = re.compile(r"[a-z]+")
+SPACE_RE = re.compile(r"\s+")
+
+def read_with_parquet_cache(path, reader, columns, normalize):
+    source = Path(path)
+    cache = source.with_suffix(".parquet")
+    if CACHE_DIR:
+        cache = Path(CACHE_DIR) / cache.name
+    if cache.exists() and cache.stat().st_mtime >= source.stat().st_mtime:
+        try:
+            return pd.read_parquet(cache, columns=columns, engine="pyarrow")
+        except Exception:
+            pass
+    df = reader(path)
+    df.columns = [normalize(str(c).strip()) for c in df.columns]
+    # written under a temporary name and renamed into place, so a crash never leaves a partial sidecar
+    tmp = cache.with_suffix(f".{os.getpid()}.parquet")
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp, engine="pyarrow", compression="zstd")
+        os.replace(tmp, cache)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+    return df[columns].copy()
+
+def read_xlsx_streaming(path):
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.values
+        header = next(rows)
+        return pd.DataFrame(rows, columns=header)
+    finally:
+        wb.close()
+
+def read_csv_arrow(path):
+    table = pacsv.read_csv(path, parse_options=pacsv.ParseOptions(invalid_row_handler=lambda row: "skip"))
+    return table.to_pandas()
+
+def prepare_agri(agri):
+    agri["Production"] = pd.to_numeric(agri["Production"], errors="coerce").fillna(0.0)
+    for col in ("State", "Crop"):
+        agri[col] = agri[col].str.strip().str.replace(SPACE_RE, " ", regex=True)
+    agri["State"] = agri["State"].replace(STATE_ALIASES).astype("category")
+    agri["Crop"] = agri["Crop"].astype("category")
+    agri["Crop_Year"] = pd.to_numeric(agri["Crop_Year"], downcast="integer")
+    return agri.set_index(["State", "Crop_Year"]).sort_index()
+
+def prepare_rain(rain):
+    rain["SUBDIVISION"] = rain["SUBDIVISION"].astype(str).str.upper().astype("category")
+    rain["YEAR"] = pd.to_numeric(rain["YEAR"], downcast="integer")
+    rain["ANNUAL"] = pd.to_numeric(rain["ANNUAL"], errors="coerce").replace([np.inf, -np.inf], np.nan).astype("float32")
+    return rain.set_index(["SUBDIVISION", "YEAR"])
+
+@st.cache_resource(show_spinner="Loading datasets…")
 def load_data():
     try:
-        agri = pd.read_excel(AGRI_PATH, engine='openpyxl')
+        agri = read_with_parquet_cache(AGRI_PATH, read_xlsx_streaming, AGRI_COLUMNS, str.title)
     except Exception as e:
         st.error(f"Error reading {AGRI_PATH}: {e}")
         agri = pd.DataFrame()
 
     try:
-        rain = pd.read_csv(RAINFALL_PATH, encoding='utf-8', on_bad_lines='skip')
+        rain = read_with_parquet_cache(RAINFALL_PATH, read_csv_arrow, RAIN_COLUMNS, str.upper)
     except Exception as e:
         st.error(f"Error reading {RAINFALL_PATH}: {e}")
         rain = pd.DataFrame()
 
+    if not agri.empty:
+        agri = prepare_agri(agri)
+    if not rain.empty:
+        rain = prepare_rain(rain)
+
     return agri, rain
 
 agri_df, rain_df = load_data()
 
 if agri_df.empty or rain_df.empty:
     st.warning("⚠️ One or both datasets failed to load. Please check file paths and formats.")
-else:
-    st.success("✅ Datasets loaded successfully!")
-
-
-agri_df.columns = [c.strip().title() for c in agri_df.columns]
-rain_df.columns = [c.strip().upper() for c in rain_df.columns]
-
-
-STATES = sorted(agri_df['State'].dropna().unique())
-
-def fuzzy_match_state(name):
-    matches = difflib.get_close_matches(name, STATES, n=1, cutoff=0.6)
-    return matches[0] if matches else None
-
-def extract_state(query):
-    for s in STATES:
-        if s.lower() in query.lower():
-            return s
-    words = query.split()
-    for w in words:
-        match = fuzzy_match_state(w.title())
-        if match:
-            return match
-    return None
-
-def extract_crop(query):
-    crops = agri_df['Crop'].dropna().unique()
+    st.stop()
+
+st.success("✅ Datasets loaded successfully!")
+
+
+def fuzzy_choice(name, choices, cutoff):
+    res = process.extractOne(name, choices, scorer=fuzz.WRatio, score_cutoff=cutoff * 100)
+    return res[0] if res else None
+
+# underscore args are left out of the cache key; the frames come from the cached loader
+@st.cache_resource
+def build_vocabulary(_agri, _rain):
+    states = tuple(sorted(_agri.index.unique('State')))
+    crops = tuple(sorted(_agri['Crop'].dropna().unique()))
+    subdivs = tuple(_rain.index.unique('SUBDIVISION'))
+    state_subdivs = {s: STATE_SUBDIV_OVERRIDES.get(s) or fuzzy_choice(s.upper(), subdivs, 0.65) for s in states}
+    return states, crops, subdivs, state_subdivs
+
+STATES, CROPS, RAIN_SUBDIVS, STATE_SUBDIVS = build_vocabulary(agri_df, rain_df)
+LATEST_YEAR = int(agri_df.index.levels[1].max())
+
+@st.cache_resource
+def build_lookup_tables(_agri, _rain):
+    rain_table = _rain.groupby(level=['SUBDIVISION', 'YEAR'])['ANNUAL'].mean().to_dict()
+    prod_table = _agri.groupby(['State', 'Crop_Year', 'Crop'], observed=True)['Production'].sum()
+    prod_table = (
+        prod_table.reset_index()
+        .sort_values(['State', 'Crop_Year', 'Production'], ascending=[True, True, False], kind='stable')
+        .set_index(['State', 'Crop_Year', 'Crop'])['Production']
+    )
+    return rain_table, prod_table
+
+RAIN_TABLE, PROD_TABLE = build_lookup_tables(agri_df, rain_df)
+
+RAIN_WORDS = ["rain", "rainfall", "precipitation", "climate"]
+CROP_WORDS = ["crop", "production", "yield", "harvest", "farm"]
+
+CATEGORY_SECTIONS = {
+    "rainfall": {"rainfall"},
+    "crop": {"crop"},
+    "unknown": {"rainfall", "crop"},
+}
+
+@st.cache_resource
+def build_query_automaton(states, crops):
+    automaton = ahocorasick.Automaton()
+    for w in RAIN_WORDS:
+        automaton.add_word(w, ("rain_word", w))
+    for w in CROP_WORDS:
+        automaton.add_word(w, ("crop_word", w))
     for c in crops:
-        if c.lower() in query.lower():
-            return c
+        automaton.add_word(c.lower(), ("crop", c))
+    for s in states:
+        automaton.add_word(s.lower(), ("state", s))
+    automaton.make_automaton()
+    return automaton
+
+QUERY_AUTOMATON = build_query_automaton(STATES, CROPS)
+
+def scan_query(qlow):
+    hits = {"state": [], "crop": [], "rain_word": [], "crop_word": []}
+    for _, (kind, name) in QUERY_AUTOMATON.iter(qlow):
+        hits[kind].append(name)
+    for names in hits.values():
+        names.sort(key=len, reverse=True)
+    return hits
+
+def extract_state(qlow, hits):
+    if hits["state"]:
+        return hits["state"][0]
+    words = [w.title() for w in WORD_RE.findall(qlow)]
+    if not words:
+        return None
+    scores = process.cdist(words, STATES, scorer=fuzz.ratio, score_cutoff=60)
+    best = scores.argmax(axis=1)
+    for i, j in enumerate(best):
+        if scores[i, j]:
+            return STATES[j]
     return None
 
-def extract_year(query):
-    year_match = re.search(r"(19|20)\d{2}", query)
+def extract_crop(hits):
+    return hits["crop"][0] if hits["crop"] else None
+
+def extract_year(qlow):
+    year_match = YEAR_RE.search(qlow)
     if year_match:
         return int(year_match.group(0))
-    return int(agri_df['Crop_Year'].max())
+    return LATEST_YEAR
 
-def extract_top_n(query):
-    match = re.search(r"top\s*(\d+)", query.lower())
+def extract_top_n(qlow):
+    match = TOP_RE.search(qlow)
     return int(match.group(1)) if match else 3
 
-def detect_category(query):
-    q = query.lower()
-    if any(word in q for word in ["rain", "rainfall", "precipitation", "climate"]):
+def detect_category(hits):
+    if hits["rain_word"]:
         return "rainfall"
-    elif any(word in q for word in ["crop", "production", "yield", "harvest", "farm"]):
+    elif hits["crop_word"]:
         return "crop"
     else:
         return "unknown"
 
 
-def answer_query(query):
-    state = extract_state(query)
-    crop = extract_crop(query)
-    year = extract_year(query)
-    top_n = extract_top_n(query)
-    category = detect_category(query)
+def parse_query(qlow):
+    hits = scan_query(qlow)
+    return extract_state(qlow, hits), extract_crop(hits), extract_year(qlow), extract_top_n(qlow), detect_category(hits)
 
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def compute_answer(state, crop, year, top_n, category):
     if not state:
-        return "⚠️ Please mention a valid state name (even approximately).", ""
+        return "⚠️ Please mention a valid state name (even approximately).", []
 
     results = []
     provenance = []
+    sections = CATEGORY_SECTIONS[category]
 
     # 🌧️ RAINFALL LOGIC
-    if category in ["rainfall", "unknown"] and not rain_df.empty:
-        match = difflib.get_close_matches(state.upper(), rain_df['SUBDIVISION'].astype(str).unique(), n=1, cutoff=0.5)
-        if match:
-            sub = match[0]
-            subset = rain_df[rain_df['SUBDIVISION'] == sub]
-            subset = subset[subset['YEAR'] == year]
-            if not subset.empty:
-                avg_rain = subset['ANNUAL'].mean()
-                results.append(f"🌧️ Average annual rainfall in **{state}** for **{year}**: {avg_rain:.2f} mm")
-                provenance.append(f"rain_df[(SUBDIVISION=='{sub}') & (YEAR=={year})]['ANNUAL'].mean()")
-
-
-    if category in ["crop", "unknown"] and not agri_df.empty:
-        subset = agri_df[(agri_df["State"].str.contains(state, case=False, na=False)) &
-                         (agri_df["Crop_Year"] == year)]
+    if "rainfall" in sections:
+        sub = STATE_SUBDIVS.get(state)
+        avg_rain = RAIN_TABLE.get((sub, year))
+        if avg_rain is not None:
+            results.append(f"🌧️ Average annual rainfall in **{state}** for **{year}**: {avg_rain:.2f} mm")
+            provenance.append(f"rain_df[(SUBDIVISION=='{sub}') & (YEAR=={year})]['ANNUAL'].mean()")
+
+
+    if "crop" in sections:
+        try:
+            production = PROD_TABLE.loc[(state, year)]
+        except KeyError:
+            production = PROD_TABLE.iloc[:0]
         if crop:
-            subset = subset[subset["Crop"].str.contains(crop, case=False, na=False)]
-
-        if not subset.empty:
-            top_crops = (
-                subset.groupby("Crop")["Production"]
-                .sum()
-                .sort_values(ascending=False)
-                .head(top_n)
-            )
+            production = production[production.index == crop]
+
+        if not production.empty:
+            top_crops = production.head(top_n)
             crops_str = ", ".join([f"{c} ({p:.1f} tonnes)" for c, p in top_crops.items()])
             results.append(f"🌾 Top {top_n} crops in **{state}** for {year}: {crops_str}")
             if crop:
-                provenance.append(f"agri_df[(State contains '{state}') & (Crop=='{crop}') & (Crop_Year=={year})]")
+                provenance.append(f"agri_df.loc[('{state}', {year})][Crop=='{crop}']")
             else:
-                provenance.append(f"agri_df[(State contains '{state}') & (Crop_Year=={year})].groupby('Crop')['Production'].sum().head({top_n})")
+                provenance.append(f"agri_df.loc[('{state}', {year})].groupby('Crop')['Production'].sum().nlargest({top_n})")
 
     if not results:
-        return "❌ No matching records found in datasets. Try a different year or state name.", ""
+        return "❌ No matching records found in datasets. Try a different year or state name.", []
 
     final_answer = "\n\n".join(results)
-    prov_text = "\n".join([f"```python\n{p}\n```" for p in provenance])
 
-    return final_answer, prov_text
+    return final_answer, provenance
+
+def answer_query(query):
+    qlow = SPACE_RE.sub(" ", query.strip().lower())
+    return compute_answer(*parse_query(qlow))
 
 st.title("🌾 Project Samarth:Smart Agriculture & Rainfall Chatbot")
 st.caption("Ask about rainfall, crop production, or yield.")
@@ -148,15 +278,17 @@ if st.button("🔍 Get Answer") and query.strip():
         st.markdown(ans)
         if prov:
             with st.expander(" Logic & Provenance"):
-                st.markdown(prov)
-
-st.markdown("---")
-st.markdown("💡 **Try asking:**")
-st.markdown("- Show rainfall in Telangana for 2015")
-st.markdown("- Top 5 crops in Maharashtra for 2019")
-st.markdown("- Compare rainfall in Tamil Nadu and Kerala for 2011")
-st.markdown("- Which crop produced the most in Andhra Pradesh 2017?")
-st.markdown("- What is the average rainfall in Karnataka?")
+                st.code("\n".join(prov), language="python")
+
+st.markdown("\n".join([
+    "---",
+    "💡 **Try asking:**",
+    "- Show rainfall in Telangana for 2015",
+    "- Top 5 crops in Maharashtra for 2019",
+    "- Compare rainfall in Tamil Nadu and Kerala for 2011",
+    "- Which crop produced the most in Andhra Pradesh 2017?",
+    "- What is the average rainfall in Karnataka?",
+]))
 
 
 